@@ -1,19 +1,128 @@
 from fastapi import FastAPI, File, UploadFile, Form
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 import fitz  # PyMuPDF
+import numpy as np
 import shutil
 import os
-from PIL import Image, ImageDraw
-import comtypes.client  # For converting DOC and PPT to PDF (Windows only)
+import asyncio
+import hashlib
+import functools
+import io
+import tempfile
+import queue
+import socket
+import subprocess
+import threading
+import time
+import multiprocessing
+from pathlib import PurePath
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageColor
+import storage
+
+try:
+    import uno  # LibreOffice Python-UNO bridge
+    from com.sun.star.beans import PropertyValue
+except ImportError:
+    uno = None
+
+try:
+    import comtypes.client  # For converting DOC and PPT to PDF (Windows only)
+except ImportError:
+    comtypes = None
 
 app = FastAPI()
 
 # Directories for storing files
 UPLOAD_FOLDER = "uploaded_files"
 IMAGE_FOLDER = "pdf_images"
+CACHE_FOLDER = os.path.join(IMAGE_FOLDER, "cache")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(IMAGE_FOLDER, exist_ok=True)
+os.makedirs(CACHE_FOLDER, exist_ok=True)
+
+# Accepted values for each print option of the upload form
+UPLOAD_OPTIONS = {
+    "copy_color": {"black_and_white", "color"},
+    "orientation": {"portrait", "landscape"},
+    "paper_punch": {"no_hole", "two_holes", "three_holes"},
+    "paper_binding": {"no_staple", "corner_staple"},
+}
+
+# Upper bound on the total size of cached previews before old entries are evicted
+CACHE_MAX_BYTES = 512 << 20
+# Seconds between cache eviction passes
+CACHE_PRUNE_INTERVAL = 60
+# Entries used within this many seconds are never evicted, so previews that are
+# still being viewed keep their images
+CACHE_MIN_AGE = 300
+
+# Punch holes: circles at the left edge, at fractions of the page height
+PUNCH_HOLE_X = 20
+PUNCH_HOLE_RADIUS = 10
+PUNCH_HOLE_POSITIONS = {
+    "two_holes": [(1, 3), (2, 3)],
+    "three_holes": [(1, 4), (1, 2), (3, 4)],
+}
+
+# Coordinates for a rotated rectangle (staple) in the top left
+STAPLE_COORDS = [
+    (35, 40),  # Top-left corner
+    (75, 30),  # Top-right corner (slightly rotated)
+    (77, 35),  # Bottom-right corner
+    (37, 45),  # Bottom-left corner (slightly rotated)
+]
+
+# Largest width/height of a preview image; larger pages and photos are downscaled
+MAX_IMAGE_DIMENSION = 2000
+
+# JPEG settings for previews: quality 80 with 4:2:0 subsampling is indistinguishable
+# in the slider; optimize=True would cost a second Huffman pass
+JPEG_SAVE_OPTIONS = {"quality": 80, "subsampling": 2, "optimize": False, "progressive": False}
+
+# Process pool for PDF rasterization, page transforms and JPEG encoding. Workers
+# are spawned rather than forked since the server is already multithreaded.
+# ProcessPoolExecutor allows at most 61 workers on Windows.
+PAGE_ENCODER_WORKERS = min(os.cpu_count() or 1, 61)
+
+
+def create_page_encoder_pool() -> ProcessPoolExecutor:
+    """Create the process pool used for PDF pages."""
+    return ProcessPoolExecutor(
+        max_workers=PAGE_ENCODER_WORKERS, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+page_encoder_pool = create_page_encoder_pool()
+page_encoder_pool_lock = threading.Lock()
+# Upper bound on the pages rendered by one task; each task opens the document once
+MAX_PAGES_PER_TASK = 4
+
+# Chunk size used when streaming uploads to disk
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Headless LibreOffice workers used for DOC/PPT to PDF conversion
+SOFFICE_PATH = shutil.which("soffice") or shutil.which("libreoffice")
+LIBREOFFICE_WORKERS = 2
+LIBREOFFICE_CONNECT_TIMEOUT = 30
+LIBREOFFICE_FILTERS = {
+    "doc": "writer_pdf_Export",
+    "docx": "writer_pdf_Export",
+    "ppt": "impress_pdf_Export",
+    "pptx": "impress_pdf_Export",
+}
+office_workers = queue.Queue()
+office_worker_list = []
+
+# Word/PowerPoint COM applications are created once and reused on a single
+# dedicated thread, since COM objects belong to the apartment that created them
+office_com_apps = {}
+office_com_executor = ThreadPoolExecutor(
+    max_workers=1, initializer=comtypes.CoInitialize if comtypes is not None else None
+)
 
 # Serve static files for uploaded images
 app.mount("/static", StaticFiles(directory=IMAGE_FOLDER), name="static")
@@ -63,33 +172,325 @@ async def main():
     """
 
 
+@app.on_event("shutdown")
+def stop_page_encoders():
+    """Shut down the page encoder process pool and the io_uring rings used for writing pages."""
+    page_encoder_pool.shutdown()
+    storage.close_rings()
+
+
+@app.on_event("startup")
+def start_office_workers():
+    """Launch the pool of long-lived headless LibreOffice workers, if available."""
+    if uno is None or SOFFICE_PATH is None:
+        return
+    for _ in range(LIBREOFFICE_WORKERS):
+        # Each worker needs its own user profile to run alongside the others,
+        # including the workers of other server processes
+        worker = {"profile": tempfile.mkdtemp(prefix="lo_worker_")}
+        spawn_office_process(worker)
+        office_worker_list.append(worker)
+        office_workers.put(worker)
+
+
+def find_free_port() -> int:
+    """Return a localhost TCP port that is currently free."""
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_office_process(worker: dict):
+    """Start a headless LibreOffice process for worker on a free port."""
+    worker["port"] = find_free_port()
+    worker["desktop"] = None
+    worker["process"] = subprocess.Popen([
+        SOFFICE_PATH,
+        "--headless",
+        "--invisible",
+        "--nologo",
+        "--norestore",
+        f"-env:UserInstallation={uno.systemPathToFileUrl(worker['profile'])}",
+        f"--accept=socket,host=localhost,port={worker['port']};urp;",
+    ])
+
+
+@app.on_event("shutdown")
+def stop_office_workers():
+    """Terminate the LibreOffice worker processes and quit cached Office applications."""
+    for worker in office_worker_list:
+        worker["process"].terminate()
+    for worker in office_worker_list:
+        worker["process"].wait()
+        shutil.rmtree(worker["profile"], ignore_errors=True)
+    office_worker_list.clear()
+
+    office_com_executor.submit(quit_office_com_apps).result()
+    office_com_executor.shutdown()
+
+
+@app.on_event("startup")
+def warm_up():
+    """Pay one-time initialization costs before the first request arrives."""
+    # Start the page encoder processes, which otherwise spawn on the first PDF,
+    # and have them initialize MuPDF
+    for _ in range(PAGE_ENCODER_WORKERS):
+        page_encoder_pool.submit(warm_up_page_encoder)
+
+    # Launch Word/PowerPoint in the background when COM is the converter
+    if not office_worker_list and comtypes is not None:
+        office_com_executor.submit(get_office_com_app, "Word.Application")
+        office_com_executor.submit(get_office_com_app, "PowerPoint.Application")
+
+
+def connect_office_worker(worker: dict):
+    """Connect to a LibreOffice worker and return its Desktop."""
+    local_context = uno.getComponentContext()
+    resolver = local_context.ServiceManager.createInstanceWithContext(
+        "com.sun.star.bridge.UnoUrlResolver", local_context
+    )
+    deadline = time.monotonic() + LIBREOFFICE_CONNECT_TIMEOUT
+    while True:
+        try:
+            context = resolver.resolve(
+                f"uno:socket,host=localhost,port={worker['port']};urp;StarOffice.ComponentContext"
+            )
+            break
+        except Exception:
+            # The worker may still be starting up
+            if worker["process"].poll() is not None:
+                raise RuntimeError("LibreOffice worker exited during startup")
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.25)
+    return context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+
+
+def make_property(name: str, value):
+    """Build a UNO PropertyValue."""
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+
+def convert_with_libreoffice(input_path: str, output_path: str, file_extension: str):
+    """Convert a document to PDF on one of the pooled LibreOffice workers."""
+    worker = office_workers.get()
+    try:
+        if worker["process"].poll() is not None:
+            # The worker died; replace it before reconnecting
+            spawn_office_process(worker)
+        if worker["desktop"] is None:
+            worker["desktop"] = connect_office_worker(worker)
+        try:
+            document = worker["desktop"].loadComponentFromURL(
+                uno.systemPathToFileUrl(input_path), "_blank", 0, (make_property("Hidden", True),)
+            )
+        except Exception:
+            # Drop the connection so the next request reconnects to the worker
+            worker["desktop"] = None
+            raise
+        try:
+            document.storeToURL(
+                uno.systemPathToFileUrl(output_path),
+                (make_property("FilterName", LIBREOFFICE_FILTERS[file_extension]),),
+            )
+        finally:
+            document.close(True)
+    finally:
+        office_workers.put(worker)
+
+
+def get_office_com_app(prog_id: str):
+    """Return the cached COM application for prog_id, launching it on first use."""
+    app_object = office_com_apps.get(prog_id)
+    if app_object is None:
+        app_object = comtypes.client.CreateObject(prog_id)
+        if prog_id == "Word.Application":
+            app_object.Visible = False
+        office_com_apps[prog_id] = app_object
+    return app_object
+
+
+def quit_office_com_apps():
+    """Quit the cached Word/PowerPoint applications."""
+    for app_object in office_com_apps.values():
+        try:
+            app_object.Quit()
+        except Exception:
+            pass
+    office_com_apps.clear()
+
+
+def office_com_app_responds(app_object) -> bool:
+    """Check whether a COM application still answers calls."""
+    try:
+        app_object.Name
+        return True
+    except Exception:
+        return False
+
+
+def discard_office_com_app(prog_id: str):
+    """Drop a cached COM application so that the next conversion relaunches it."""
+    app_object = office_com_apps.pop(prog_id, None)
+    if app_object is not None:
+        try:
+            app_object.Quit()
+        except Exception:
+            pass
+
+
+def convert_with_office_com(input_path: str, output_path: str, file_extension: str):
+    """Convert a document to PDF using Word/PowerPoint through comtypes."""
+    prog_id = "Word.Application" if file_extension in ["doc", "docx"] else "PowerPoint.Application"
+    app_object = get_office_com_app(prog_id)
+    try:
+        if file_extension in ["doc", "docx"]:
+            doc = app_object.Documents.Open(input_path, ReadOnly=True)
+            try:
+                doc.SaveAs(output_path, FileFormat=17)  # 17 = PDF format
+            finally:
+                doc.Close(SaveChanges=0)
+        elif file_extension in ["ppt", "pptx"]:
+            # PowerPoint refuses Visible = False; WithWindow=False keeps it hidden
+            presentation = app_object.Presentations.Open(input_path, ReadOnly=True, WithWindow=False)
+            try:
+                presentation.SaveAs(output_path, 32)  # 32 = PDF format
+            finally:
+                presentation.Close()
+    except Exception:
+        # A document that fails to open or convert leaves the application usable;
+        # only relaunch it if it was closed or crashed
+        if not office_com_app_responds(app_object):
+            discard_office_com_app(prog_id)
+        raise
+
+
 def convert_to_pdf(input_path: str, output_path: str):
-    """Convert DOC/DOCX or PPT/PPTX to PDF using comtypes."""
+    """Convert DOC/DOCX or PPT/PPTX to PDF using LibreOffice, or comtypes on Windows."""
     file_extension = input_path.split('.')[-1].lower()
     input_path = os.path.abspath(input_path)
     output_path = os.path.abspath(output_path)
 
     try:
-        if file_extension in ["doc", "docx"]:
-            word = comtypes.client.CreateObject("Word.Application")
-            word.Visible = False
-            doc = word.Documents.Open(input_path)
-            doc.SaveAs(output_path, FileFormat=17)  # 17 = PDF format
-            doc.Close()
-            word.Quit()
-        elif file_extension in ["ppt", "pptx"]:
-            powerpoint = comtypes.client.CreateObject("PowerPoint.Application")
-            powerpoint.Visible = 1  # Debug mode; change to False after testing
-            presentation = powerpoint.Presentations.Open(input_path, WithWindow=False)
-            presentation.SaveAs(output_path, 32)  # 32 = PDF format
-            presentation.Close()
-            powerpoint.Quit()
+        if office_worker_list:
+            convert_with_libreoffice(input_path, output_path, file_extension)
+        elif comtypes is not None:
+            office_com_executor.submit(
+                convert_with_office_com, input_path, output_path, file_extension
+            ).result()
+        else:
+            raise RuntimeError("no LibreOffice or Microsoft Office installation available")
     except Exception as e:
         raise RuntimeError(f"Error converting file to PDF: {e}")
 
     return output_path
 
 
+def save_upload(src, path: str) -> str:
+    """Stream an uploaded file object to disk using large buffered writes.
+
+    Returns the SHA-256 hex digest of the contents, computed in the same pass.
+    """
+    digest = hashlib.sha256()
+    with open(path, "wb", buffering=UPLOAD_CHUNK_SIZE) as dst:
+        while chunk := src.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            dst.write(chunk)
+    return digest.hexdigest()
+
+
+async def save_upload_to_temp_file(file: UploadFile, file_extension: str) -> tuple:
+    """Save an upload to a private temporary file, returning (digest, path).
+
+    Concurrent uploads that share a filename never overwrite each other. The
+    caller deletes the file once it has been rendered; only the previews are kept.
+    """
+    fd, temp_path = tempfile.mkstemp(prefix=".tmp_", suffix=f".{file_extension}", dir=UPLOAD_FOLDER)
+    os.close(fd)
+    try:
+        digest = await run_in_threadpool(save_upload, file.file, temp_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return digest, temp_path
+
+
+def get_cached_images(cache_dir: str):
+    """Return the cached preview images in cache_dir, or None on a cache miss."""
+    try:
+        # Touch the entry so eviction treats it as recently used
+        os.utime(cache_dir)
+        names = sorted(os.listdir(cache_dir))
+    except FileNotFoundError:
+        return None
+    path_prefix = os.path.join(cache_dir, "")
+    return [path_prefix + name for name in names]
+
+
+def store_in_cache(output_dir: str, cache_dir: str) -> list:
+    """Publish a fully rendered output directory as a cache entry."""
+    try:
+        os.rename(output_dir, cache_dir)
+    except OSError:
+        # A concurrent request with the same key got there first
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return get_cached_images(cache_dir)
+
+
+def prune_cache():
+    """Evict least recently used cache entries until the cache fits in CACHE_MAX_BYTES."""
+    entries = []
+    total_size = 0
+    for entry in os.scandir(CACHE_FOLDER):
+        # Skip in-progress output directories
+        if entry.name.startswith("."):
+            continue
+        try:
+            if not entry.is_dir():
+                continue
+            last_used = entry.stat().st_mtime
+            size = sum(f.stat().st_size for f in os.scandir(entry.path))
+        except FileNotFoundError:
+            continue
+        entries.append((last_used, size, entry.path))
+        total_size += size
+
+    entries.sort()
+    now = time.time()
+    for last_used, size, path in entries:
+        if total_size <= CACHE_MAX_BYTES or now - last_used < CACHE_MIN_AGE:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total_size -= size
+
+
+async def prune_cache_periodically():
+    """Run prune_cache every CACHE_PRUNE_INTERVAL seconds, one pass at a time."""
+    while True:
+        try:
+            await run_in_threadpool(prune_cache)
+        except OSError:
+            # Try again on the next pass
+            pass
+        await asyncio.sleep(CACHE_PRUNE_INTERVAL)
+
+
+@app.on_event("startup")
+async def start_cache_pruner():
+    """Start the single background task that keeps the cache within its size limit."""
+    global cache_pruner_task
+    cache_pruner_task = asyncio.create_task(prune_cache_periodically())
+
+
+@app.on_event("shutdown")
+async def stop_cache_pruner():
+    """Stop the cache pruning task."""
+    cache_pruner_task.cancel()
+
+
 @app.post("/upload/")
 async def upload_file(
     file: UploadFile = File(...),
@@ -98,98 +499,310 @@ async def upload_file(
     paper_punch: str = Form(...),
     paper_binding: str = Form(...)
 ):
-    file_extension = file.filename.split('.')[-1].lower()
-    uploaded_file_path = os.path.join(UPLOAD_FOLDER, file.filename)
+    file_extension = PurePath(file.filename).suffix.lstrip(".").lower()
+    handler = FILE_HANDLERS.get(file_extension)
+    if handler is None:
+        return HTMLResponse(content="<h1>Unsupported file type!</h1>")
 
-    # Save the uploaded file
-    with open(uploaded_file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Options become part of the cache path, so only the known values are allowed
+    options = (copy_color, orientation, paper_punch, paper_binding)
+    if any(value not in allowed for value, allowed in zip(options, UPLOAD_OPTIONS.values())):
+        return HTMLResponse(content="<h1>Invalid print options!</h1>", status_code=400)
 
-    # Handle file conversion to PDF if needed
-    if file_extension in ["doc", "docx", "ppt", "pptx"]:
-        pdf_path = os.path.join(
-            UPLOAD_FOLDER, f"{os.path.splitext(file.filename)[0]}.pdf"
+    converted_images = await handler(file, file_extension, options)
+    return generate_html_response(converted_images)
+
+
+async def render_with_cache(digest: str, options: tuple, render, *args) -> list:
+    """Return cached previews for digest and options, rendering them on a miss.
+
+    render is called in the threadpool as render(*args, output_dir, *options).
+    """
+    # Identical uploads with identical options reuse the previously rendered previews
+    cache_dir = os.path.join(CACHE_FOLDER, "_".join((digest,) + options))
+    cached_images = get_cached_images(cache_dir)
+    if cached_images:
+        return cached_images
+
+    # Render into a private directory that becomes the cache entry once complete
+    output_dir = tempfile.mkdtemp(prefix=".tmp_", dir=CACHE_FOLDER)
+    try:
+        await run_in_threadpool(render, *args, output_dir, *options)
+    except BaseException:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+    return store_in_cache(output_dir, cache_dir)
+
+
+async def handle_image(file: UploadFile, file_extension: str, options: tuple) -> list:
+    """Preview a JPG/PNG upload."""
+    # Images are processed straight from memory and never written to disk as-is
+    contents = await file.read()
+    digest = await run_in_threadpool(lambda: hashlib.sha256(contents).hexdigest())
+    return await render_with_cache(digest, options, render_image, io.BytesIO(contents), file_extension)
+
+
+async def handle_pdf(file: UploadFile, file_extension: str, options: tuple) -> list:
+    """Preview a PDF upload."""
+    digest, uploaded_file_path = await save_upload_to_temp_file(file, file_extension)
+    try:
+        return await render_with_cache(digest, options, convert_pdf_to_images, uploaded_file_path)
+    finally:
+        os.remove(uploaded_file_path)
+
+
+async def handle_office(file: UploadFile, file_extension: str, options: tuple) -> list:
+    """Preview a DOC/DOCX/PPT/PPTX upload by way of PDF."""
+    digest, uploaded_file_path = await save_upload_to_temp_file(file, file_extension)
+    try:
+        return await render_with_cache(digest, options, convert_office_to_images, uploaded_file_path)
+    finally:
+        os.remove(uploaded_file_path)
+
+
+def render_image(source, file_extension: str, output_dir: str, copy_color: str, orientation: str, paper_punch: str, paper_binding: str) -> list:
+    """Process an uploaded image into output_dir."""
+    image_path = os.path.join(output_dir, f"page_0001.{file_extension}")
+    return [process_image(source, image_path, copy_color, orientation, paper_punch, paper_binding)]
+
+
+def convert_office_to_images(input_path: str, output_dir: str, copy_color: str, orientation: str, paper_punch: str, paper_binding: str) -> list:
+    """Convert an Office document to PDF and render its pages into output_dir."""
+    # The converted PDF is only needed while its pages are rendered
+    fd, pdf_path = tempfile.mkstemp(prefix=".tmp_", suffix=".pdf", dir=UPLOAD_FOLDER)
+    os.close(fd)
+    try:
+        convert_to_pdf(input_path, pdf_path)
+        return convert_pdf_to_images(pdf_path, output_dir, copy_color, orientation, paper_punch, paper_binding)
+    finally:
+        os.remove(pdf_path)
+
+
+# Upload handlers by lower-case file extension
+FILE_HANDLERS = {
+    "pdf": handle_pdf,
+    "jpg": handle_image,
+    "jpeg": handle_image,
+    "png": handle_image,
+    "doc": handle_office,
+    "docx": handle_office,
+    "ppt": handle_office,
+    "pptx": handle_office,
+}
+
+
+def render_pages(pdf_path: str, first_page: int, last_page: int, output_dir: str, copy_color: str, orientation: str, paper_punch: str, paper_binding: str) -> list:
+    """Rasterize, transform and JPEG-encode pages first_page to last_page - 1 of a PDF.
+
+    Runs in the page encoder process pool, so it must stay a top-level function.
+    The document is opened once for the whole page range. Returns (image_path,
+    data) pairs, leaving the disk writes to the caller.
+    """
+    page_path_prefix = os.path.join(output_dir, "page_")
+    pages = []
+    with fitz.open(pdf_path) as pdf_doc:
+        for page_num in range(first_page, last_page):
+            page = pdf_doc[page_num]
+            # Oversized pages are rendered at a lower DPI to stay within MAX_IMAGE_DIMENSION
+            dpi = min(150, MAX_IMAGE_DIMENSION * 72 / max(page.rect.width, page.rect.height))
+            pix = page.get_pixmap(dpi=dpi)
+
+            # Hand the raw pixels straight to PIL instead of a JPEG save/reopen round-trip
+            img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+            img = apply_transforms(img, copy_color, orientation, paper_punch, paper_binding)
+            buffer = io.BytesIO()
+            img.save(buffer, "JPEG", **JPEG_SAVE_OPTIONS)
+            pages.append((f"{page_path_prefix}{page_num + 1:04d}.jpg", buffer.getvalue()))
+    return pages
+
+
+def warm_up_page_encoder():
+    """Render a tiny page so MuPDF loads its fonts and initializes its caches."""
+    with fitz.open() as pdf_doc:
+        page = pdf_doc.new_page(width=72, height=72)
+        page.insert_text((10, 36), "warm-up")
+        page.get_pixmap(dpi=72)
+
+
+def replace_broken_page_encoder_pool(broken_pool: ProcessPoolExecutor):
+    """Swap in a fresh page encoder pool, unless another request already has."""
+    global page_encoder_pool
+    with page_encoder_pool_lock:
+        if page_encoder_pool is broken_pool:
+            page_encoder_pool = create_page_encoder_pool()
+    broken_pool.shutdown(wait=False)
+
+
+def submit_page_ranges(pool: ProcessPoolExecutor, pdf_path: str, page_count: int, output_dir: str, copy_color: str, orientation: str, paper_punch: str, paper_binding: str) -> set:
+    """Submit render_pages tasks covering every page of a PDF, returning their futures."""
+    # MuPDF holds the GIL, so pages are rendered in the process pool, split into
+    # contiguous page ranges. Ranges are kept short so that the first ones finish,
+    # and get written out, while the rest of the document is still rendering.
+    pages_per_task = min(max(-(-page_count // PAGE_ENCODER_WORKERS), 1), MAX_PAGES_PER_TASK)
+    return {
+        pool.submit(
+            render_pages, pdf_path, first_page, min(first_page + pages_per_task, page_count),
+            output_dir, copy_color, orientation, paper_punch, paper_binding
         )
-        pdf_path = convert_to_pdf(uploaded_file_path, pdf_path)
-    elif file_extension == "pdf":
-        pdf_path = uploaded_file_path
-    elif file_extension in ["jpg", "jpeg", "png"]:
-        image_path = os.path.join(IMAGE_FOLDER, file.filename)
-        shutil.copyfile(uploaded_file_path, image_path)
-        converted_images = [process_image(image_path, copy_color, orientation, paper_punch, paper_binding)]
-        return generate_html_response(converted_images)
+        for first_page in range(0, page_count, pages_per_task)
+    }
+
+
+def convert_pdf_to_images(pdf_path: str, output_dir: str, copy_color: str, orientation: str, paper_punch: str, paper_binding: str) -> list:
+    """Render all pages of a PDF in parallel, returning processed images in page order."""
+    with fitz.open(pdf_path) as pdf_doc:
+        page_count = len(pdf_doc)
+
+    pool = page_encoder_pool
+    options = (copy_color, orientation, paper_punch, paper_binding)
+    try:
+        pending = submit_page_ranges(pool, pdf_path, page_count, output_dir, *options)
+    except BrokenProcessPool:
+        # A worker died during an earlier request, e.g. killed for running out of memory
+        replace_broken_page_encoder_pool(pool)
+        pool = page_encoder_pool
+        pending = submit_page_ranges(pool, pdf_path, page_count, output_dir, *options)
+
+    # Write pages out as their ranges finish, while the remaining ranges are still
+    # rendering; every batch of finished pages goes to disk in one submission
+    image_paths = []
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            pages = [page for future in done for page in future.result()]
+            storage.write_files(pages)
+            image_paths.extend(image_path for image_path, _ in pages)
+    except BrokenProcessPool:
+        # Possibly this document crashed MuPDF; fail only this request and let
+        # the next one start on a fresh pool
+        replace_broken_page_encoder_pool(pool)
+        raise
+    return sorted(image_paths)
+
+
+def process_image(source, image_path: str, copy_color: str, orientation: str, paper_punch: str, paper_binding: str) -> str:
+    """Apply transformations to an image (a path or file object) and save the processed copy to image_path."""
+    with Image.open(source) as img:
+        # Let the JPEG decoder downscale first, then clamp to MAX_IMAGE_DIMENSION
+        img.draft("RGB", (MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION))
+        img.thumbnail((MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION), Image.Resampling.LANCZOS)
+        img = apply_transforms(img, copy_color, orientation, paper_punch, paper_binding)
+        return save_processed_image(img, image_path)
+
+
+def save_processed_image(img: Image.Image, image_path: str) -> str:
+    """Save a transformed image and return its path."""
+    if image_path.lower().endswith((".jpg", ".jpeg")):
+        img.save(image_path, "JPEG", **JPEG_SAVE_OPTIONS)
     else:
-        return HTMLResponse(content="<h1>Unsupported file type!</h1>")
+        img.save(image_path)
+    return image_path
 
-    # Convert PDF to images
-    pdf_doc = fitz.open(pdf_path)
-    converted_images = []
 
-    for page_num in range(len(pdf_doc)):
-        page = pdf_doc[page_num]
-        pix = page.get_pixmap(dpi=150)
-        image_path = os.path.join(
-            IMAGE_FOLDER, f"{os.path.basename(pdf_path).split('.')[0]}_page_{page_num + 1}.jpg"
-        )
-        pix.save(image_path)
-        converted_images.append(process_image(image_path, copy_color, orientation, paper_punch, paper_binding))
+def hole_mask(cy: int, width: int, height: int):
+    """Return the (box, mask) of a punch hole centred on row cy, or None if it is off the image."""
+    y0, y1 = max(cy - PUNCH_HOLE_RADIUS, 0), min(cy + PUNCH_HOLE_RADIUS + 1, height)
+    x0, x1 = PUNCH_HOLE_X - PUNCH_HOLE_RADIUS, min(PUNCH_HOLE_X + PUNCH_HOLE_RADIUS + 1, width)
+    if y1 <= y0 or x1 <= x0:
+        return None
+    yy, xx = np.ogrid[y0:y1, x0:x1]
+    circle = (yy - cy) ** 2 + (xx - PUNCH_HOLE_X) ** 2 <= PUNCH_HOLE_RADIUS ** 2
+    return (x0, y0, x1, y1), Image.fromarray(circle)
 
-    pdf_doc.close()
-    return generate_html_response(converted_images)
 
+def convex_polygon_mask(coords: list, width: int, height: int):
+    """Return the (box, mask) of a convex polygon given by its vertices in order, or None if it is off the image."""
+    xs, ys = zip(*coords)
+    y0, y1 = max(min(ys), 0), min(max(ys) + 1, height)
+    x0, x1 = max(min(xs), 0), min(max(xs) + 1, width)
+    if y1 <= y0 or x1 <= x0:
+        # The polygon lies entirely outside the image
+        return None
+    yy, xx = np.ogrid[y0:y1, x0:x1]
+
+    # A point is inside when it lies on the same side of every edge
+    inside_left = np.ones((y1 - y0, x1 - x0), dtype=bool)
+    inside_right = np.ones((y1 - y0, x1 - x0), dtype=bool)
+    for (ax, ay), (bx, by) in zip(coords, coords[1:] + coords[:1]):
+        cross = (bx - ax) * (yy - ay) - (by - ay) * (xx - ax)
+        inside_left &= cross >= 0
+        inside_right &= cross <= 0
+    return (x0, y0, x1, y1), Image.fromarray(inside_left | inside_right)
 
-from PIL import Image, ImageDraw
 
-def process_image(image_path: str, copy_color: str, orientation: str, paper_punch: str, paper_binding: str) -> str:
-    """Apply transformations to an image based on copy_color, orientation, paper_punch, and paper_binding."""
-    with Image.open(image_path) as img:
-        # Apply grayscale if black_and_white is selected
-        if copy_color == "black_and_white":
+@functools.lru_cache(maxsize=64)
+def annotation_masks(width: int, height: int, paper_punch: str, paper_binding: str) -> tuple:
+    """Return (box, mask) pairs for the punch hole and staple marks.
+
+    Every page of a document has the same size and options, so the marks are
+    rasterized once and reused for the remaining pages.
+    """
+    # Add visual indicators for paper punch
+    marks = [
+        hole_mask(numerator * height // denominator, width, height)
+        for numerator, denominator in PUNCH_HOLE_POSITIONS.get(paper_punch, ())
+    ]
+
+    # Add staple mark in top left
+    if paper_binding == "corner_staple":
+        marks.append(convex_polygon_mask(STAPLE_COORDS, width, height))
+
+    return tuple(mark for mark in marks if mark is not None)
+
+
+def apply_transforms(img: Image.Image, copy_color: str, orientation: str, paper_punch: str, paper_binding: str) -> Image.Image:
+    """Apply transformations to an image based on copy_color, orientation, paper_punch, and paper_binding.
+
+    Marks only touch their own bounding boxes instead of the whole page.
+    """
+    has_marks = paper_punch in PUNCH_HOLE_POSITIONS or paper_binding == "corner_staple"
+    if copy_color != "black_and_white" and orientation != "landscape" and not has_marks:
+        # Nothing to change
+        return img
+
+    # Apply grayscale if black_and_white is selected
+    if copy_color == "black_and_white":
+        if img.mode != "L":
             img = img.convert("L")
+    elif img.mode not in ("L", "RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info or "A" in img.getbands() else "RGB")
 
-        # Apply rotation for landscape orientation
-        if orientation == "landscape":
-            img = img.rotate(90, expand=True)
-
-        # Add visual indicators for paper punch
-        draw = ImageDraw.Draw(img)
-        width, height = img.size
-
-        if paper_punch == "two_holes":
-            draw.ellipse((10, height // 3 - 10, 30, height // 3 + 10), fill="grey")  # First hole
-            draw.ellipse((10, 2 * height // 3 - 10, 30, 2 * height // 3 + 10), fill="grey")  # Second hole
-        elif paper_punch == "three_holes":
-            draw.ellipse((10, height // 4 - 10, 30, height // 4 + 10), fill="grey")  # Top hole
-            draw.ellipse((10, height // 2 - 10, 30, height // 2 + 10), fill="grey")  # Middle hole
-            draw.ellipse((10, 3 * height // 4 - 10, 30, 3 * height // 4 + 10), fill="grey")  # Bottom hole
-
-        # Add staple mark in top left
-        if paper_binding == "corner_staple":
-            # Coordinates for a rotated rectangle (staple)
-            staple_coords = [
-                (35, 40),  # Top-left corner
-                (75, 30),  # Top-right corner (slightly rotated)
-                (77, 35),  # Bottom-right corner
-                (37, 45),  # Bottom-left corner (slightly rotated)
-            ]
-            draw.polygon(staple_coords, fill="grey")
-
-        # Save the transformed image
-        transformed_image_path = os.path.join(
-            IMAGE_FOLDER, f"processed_{os.path.basename(image_path)}"
-        )
-        img.save(transformed_image_path)
-        return transformed_image_path
+    # Apply rotation for landscape orientation
+    if orientation == "landscape":
+        img = img.transpose(Image.Transpose.ROTATE_90)
+
+    # Add paper punch and staple marks
+    if has_marks:
+        fill = ImageColor.getcolor("grey", img.mode)
+        for box, mask in annotation_masks(img.width, img.height, paper_punch, paper_binding):
+            img.paste(fill, box, mask)
 
-def generate_html_response(image_files: list) -> HTMLResponse:
-    """Generate HTML response to display images in a slider."""
-    slider_html = """
+    return img
+
+def generate_html_response(image_files: list) -> StreamingResponse:
+    """Generate a streamed HTML response to display images in a slider."""
+    return StreamingResponse(generate_html_chunks(image_files), media_type="text/html")
+
+
+def generate_html_chunks(image_files: list):
+    """Yield the slider page in chunks: header, image tags, then controls and footer."""
+    yield """
+    <html>
+        <head>
+            <title>File Preview</title>
+        </head>
+        <body>
+            <h1>File Preview with Selected Options</h1>
     <div id="slider" style="width: 600px; overflow: hidden; margin: auto;">
         <div id="slides" style="display: flex; transition: transform 0.5s;">
     """
-    for image_file in image_files:
-        slider_html += f'<img src="/static/{os.path.basename(image_file)}" style="width: 600px; height: auto;">'
-    slider_html += """
+    # Every preview lives under IMAGE_FOLDER, so its URL is the path minus that prefix
+    prefix_length = len(os.path.join(IMAGE_FOLDER, ""))
+    yield "".join(
+        f'<img src="/static/{image_file[prefix_length:].replace(os.sep, "/")}" style="width: 600px; height: auto;">'
+        for image_file in image_files
+    )
+    yield """
         </div>
     </div>
     <button onclick="moveSlider(-1)">Previous</button>
@@ -203,18 +816,7 @@ def generate_html_response(image_files: list) -> HTMLResponse:
             slides.style.transform = `translateX(-${currentIndex * 600}px)`;
         }
     </script>
-    """
-
-    return HTMLResponse(content=f"""
-    <html>
-        <head>
-            <title>File Preview</title>
-        </head>
-        <body>
-            <h1>File Preview with Selected Options</h1>
-            {slider_html}
             <p><a href="/">Go back to upload another file</a></p>
         </body>
     </html>
-    """)
-
+    """
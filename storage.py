@@ -0,0 +1,122 @@
+"""File writes, batched into io_uring submissions on Linux when liburing is available."""
+import os
+import queue
+import sys
+import threading
+
+try:
+    import liburing
+except ImportError:
+    liburing = None
+
+USE_IO_URING = sys.platform == "linux" and liburing is not None
+
+# Submission queue size of each ring; larger batches are submitted in slices
+IO_URING_ENTRIES = 256
+
+# Rings are set up once and shared by the threads doing writes. At most IO_URING_RINGS
+# exist at a time; a batch that finds them all busy is written synchronously instead.
+IO_URING_RINGS = 4
+idle_rings = queue.Queue()
+ring_count = 0
+ring_lock = threading.Lock()
+
+
+def write_files(files: list):
+    """Write each (path, data) pair in files, replacing any existing file."""
+    if USE_IO_URING and files:
+        ring = acquire_ring()
+        if ring is not None:
+            try:
+                for start in range(0, len(files), IO_URING_ENTRIES):
+                    write_files_io_uring(ring, files[start:start + IO_URING_ENTRIES])
+            except BaseException:
+                # The ring may still hold unreaped completions, so don't reuse it
+                discard_ring(ring)
+                raise
+            idle_rings.put(ring)
+            return
+
+    for path, data in files:
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+def acquire_ring():
+    """Take an idle (ring, cqe) pair, setting up a new one if the pool has room.
+
+    Returns None if io_uring is unavailable or every ring is busy.
+    """
+    global USE_IO_URING, ring_count
+    try:
+        return idle_rings.get_nowait()
+    except queue.Empty:
+        pass
+
+    with ring_lock:
+        if ring_count >= IO_URING_RINGS:
+            return None
+        ring_count += 1
+
+    ring = liburing.Ring()
+    try:
+        liburing.trap_error(liburing.io_uring_queue_init(IO_URING_ENTRIES, ring))
+    except OSError:
+        # io_uring may be disabled by the kernel or a seccomp policy
+        with ring_lock:
+            ring_count -= 1
+        USE_IO_URING = False
+        return None
+    return ring, liburing.Cqe()
+
+
+def discard_ring(ring):
+    """Tear down a (ring, cqe) pair, freeing its slot in the pool."""
+    global ring_count
+    liburing.io_uring_queue_exit(ring[0])
+    with ring_lock:
+        ring_count -= 1
+
+
+def close_rings():
+    """Tear down every idle ring; called on shutdown."""
+    while True:
+        try:
+            ring = idle_rings.get_nowait()
+        except queue.Empty:
+            return
+        discard_ring(ring)
+
+
+def write_files_io_uring(ring, files: list):
+    """Write at most IO_URING_ENTRIES (path, data) pairs with a single io_uring submission."""
+    ring, cqe = ring
+    fds = []
+    try:
+        for path, _ in files:
+            fds.append(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644))
+
+        # Queue every write, then submit them all with one io_uring_enter call
+        for index, (fd, (_, data)) in enumerate(zip(fds, files)):
+            sqe = liburing.io_uring_get_sqe(ring)
+            liburing.io_uring_prep_write(sqe, fd, data, 0)
+            liburing.io_uring_sqe_set_data64(sqe, index)
+        liburing.trap_error(liburing.io_uring_submit_and_wait(ring, len(files)))
+
+        # Reap every completion before reporting errors, so the ring stays clean
+        results = {}
+        for _ in files:
+            liburing.trap_error(liburing.io_uring_wait_cqe(ring, cqe))
+            entry = cqe[0]
+            results[liburing.io_uring_cqe_get_data64(entry)] = entry.res
+            liburing.io_uring_cqe_seen(ring, entry)
+
+        for index, written in results.items():
+            liburing.trap_error(written)
+            # Finish short writes synchronously
+            data = memoryview(files[index][1])
+            while written < len(data):
+                written += os.pwrite(fds[index], data[written:], written)
+    finally:
+        for fd in fds:
+            os.close(fd)